@@ -10,11 +10,15 @@ fake_items_db = [
 ]
 
 @app.get("/items/")
-async def read_items(skip: int = 0, limit: int = 10):
-    return fake_items_db[skip : skip + limit]
+async def read_items(skip: int = 0, limit: int = 10, q: Optional[str] = None):
+    items = fake_items_db
+    if q:
+        # Case-insensitive match on the name; fine for a handful of items
+        items = [item for item in items if q.lower() in item["item_name"].lower()]
+    return items[skip : skip + limit]
 
 @app.get("/items/{item_id}")
 async def read_item(item_id: int, q: Optional[str] = None):
     if q:
         return {"item_id": item_id, "q": q}
-    return {"item_id": item_id} 
\ No newline at end of file
+    return {"item_id": item_id}
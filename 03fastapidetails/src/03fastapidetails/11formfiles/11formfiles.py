@@ -1,10 +1,673 @@
-from fastapi import FastAPI, File, UploadFile, Form
-from typing import Optional
+from fastapi import FastAPI, File, UploadFile, Form, Request, Response, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+from typing import Optional, List, Tuple
+from tempfile import SpooledTemporaryFile, TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import hashlib
+import json
+import secrets
 import shutil
+import sqlite3
 import os
+import time
+import tracemalloc
+import uuid
+import zlib
+from urllib.parse import quote
+
+try:
+    from python_multipart.multipart import MultipartParser, MultipartState, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, MultipartState, parse_options_header
 
 app = FastAPI()
 
+# Upload configuration
+UPLOAD_DIR = "uploads"
+PARTIAL_DIR = f"{UPLOAD_DIR}/.partial"  # Resumable uploads live here until finalized
+# The blob store has its own root: uploads/ holds files named by clients,
+# so an upload called index.db or blobs must not land on the store
+BLOB_ROOT = "blobstore"
+BLOB_DIR = f"{BLOB_ROOT}/blobs"  # Content-addressed store, one file per SHA-256
+BLOB_INDEX_PATH = f"{BLOB_ROOT}/index.db"  # Filenames and refcounts for the blob store
+CHUNK_SIZE = 1024 * 1024  # Write to disk in 1 MiB chunks
+MAX_RANGES = 100  # Larger Range headers are ignored and the whole file is sent
+SPOOL_MAX_SIZE = int(os.getenv("SPOOL_MAX_SIZE", 1024 * 1024))  # Spill to disk above this size
+MAX_FIELD_SIZE = 64 * 1024  # Non-file form fields are kept in memory up to this size
+
+# Resumable upload limits
+RESUMABLE_MAX_SIZE = int(os.getenv("RESUMABLE_MAX_SIZE", 10 * 1024 ** 3))  # Largest size a client may announce
+RESUMABLE_EXPIRE_SECONDS = int(os.getenv("RESUMABLE_EXPIRE_SECONDS", 24 * 3600))  # Idle uploads are deleted after this
+RESUMABLE_SWEEP_SECONDS = int(os.getenv("RESUMABLE_SWEEP_SECONDS", 3600))
+
+# Batch ingestion limits
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", 8))  # Threads shared by the whole process
+INGEST_MAX_PER_REQUEST = int(os.getenv("INGEST_MAX_PER_REQUEST", 4))  # Files in flight per request
+INGEST_MAX_FILE_SIZE = int(os.getenv("INGEST_MAX_FILE_SIZE", 100 * 1024 * 1024))
+
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_MAX_WORKERS, thread_name_prefix="ingest")
+
+# Models
+class UploadStats(BaseModel):
+    filename: str
+    description: Optional[str] = None
+    content_type: Optional[str] = None
+    size: int
+    chunks: int
+    elapsed_ms: float
+    throughput_mb_s: float
+
+class DigestResult(BaseModel):
+    filename: Optional[str] = None
+    size: int
+    sha256: str
+    crc32: str
+    spooled_to_disk: bool
+
+class IngestResult(BaseModel):
+    filename: Optional[str] = None
+    size: int
+    sha256: Optional[str] = None
+    queued_ms: float
+    elapsed_ms: float
+    error: Optional[str] = None
+
+class ResumableUploadCreate(BaseModel):
+    filename: str
+    size: int = Field(..., ge=0, le=RESUMABLE_MAX_SIZE)
+    description: Optional[str] = None
+    sha256: Optional[str] = None  # Checked on finalize when given
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    received: int
+    missing: List[Tuple[int, int]]
+    complete: bool
+
+class StoredUpload(BaseModel):
+    id: str
+    sha256: str
+    filename: str
+    content_type: Optional[str] = None
+    description: Optional[str] = None
+    size: int
+    deduplicated: bool = False
+
+# Resumable upload state, keyed by upload id. The received ranges are also
+# saved to .partial/<id>.json after every chunk, so uploads survive a server
+# restart; "writers" and "finalizing" only matter within one process.
+resumable_uploads = {}
+
+# Streaming helpers
+async def iter_multipart(request: Request):
+    """Parse a multipart body straight off the ASGI receive channel.
+
+    Yields ("begin", (name, filename, content_type)), ("data", bytes) and
+    ("end", None) events, so parts are never buffered as a whole. A body
+    without its closing boundary is rejected with a 400 once the stream ends.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a multipart/form-data body"
+        )
+
+    events = []
+    headers = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        events.append(("begin", (
+            options.get(b"name", b"").decode(),
+            os.path.basename(filename.decode()) if filename is not None else None,
+            headers.get(b"content-type", b"").decode() or None,
+        )))
+
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for event in events:
+            yield event
+        events.clear()
+    # finalize() does not check this itself: a truncated body just stops
+    # mid-part, without the "end" event for the part being received
+    parser.finalize()
+    if parser.state != MultipartState.END:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Incomplete multipart body"
+        )
+
+class ChunkedFileWriter:
+    """Buffers incoming data into CHUNK_SIZE writes performed on the threadpool."""
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE, offset: Optional[int] = None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.offset = offset  # Write into an existing file at this offset
+        self.buffer = bytearray()
+        self.size = 0
+        self.chunks = 0
+        self.file = None
+
+    async def open(self):
+        if self.offset is None:
+            self.file = await run_in_threadpool(open, self.path, "wb")
+        else:
+            self.file = await run_in_threadpool(open, self.path, "r+b")
+            await run_in_threadpool(self.file.seek, self.offset)
+
+    async def write(self, data: bytes):
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.chunk_size:
+            chunk = bytes(self.buffer[:self.chunk_size])
+            del self.buffer[:self.chunk_size]
+            await self.write_chunk(chunk)
+
+    async def flush(self):
+        if self.buffer:
+            chunk = bytes(self.buffer)
+            self.buffer.clear()
+            await self.write_chunk(chunk)
+
+    async def write_chunk(self, chunk: bytes):
+        await run_in_threadpool(self.file.write, chunk)
+        self.size += len(chunk)
+        self.chunks += 1
+
+    async def close(self):
+        await self.flush()
+        await run_in_threadpool(self.file.close)
+
+    async def discard(self):
+        # Drop buffered data and delete the file, e.g. after a disconnect
+        self.buffer.clear()
+        if self.file is not None:
+            await run_in_threadpool(self.file.close)
+        await run_in_threadpool(os.remove, self.path)
+
+def is_safe_filename(filename: str) -> bool:
+    # basename() leaves "." and "..", which would resolve to a directory
+    return filename.strip(".") != ""
+
+def temp_location(file_location: str) -> str:
+    # Written next to the destination and renamed over it once complete, so
+    # a failed upload never leaves a truncated file under the real name
+    return f"{file_location}.{uuid.uuid4().hex}.tmp"
+
+class StreamDigest:
+    """Computes length, SHA-256 and CRC32 incrementally while spooling the data.
+
+    Only SPOOL_MAX_SIZE bytes are ever kept in memory; anything larger rolls
+    over to a temporary file, so memory use does not grow with the upload.
+    """
+
+    def __init__(self, max_size: int = SPOOL_MAX_SIZE):
+        self.spool = SpooledTemporaryFile(max_size=max_size)
+        self.sha256 = hashlib.sha256()
+        self.crc32 = 0
+        self.size = 0
+
+    async def update(self, data: bytes):
+        self.sha256.update(data)
+        self.crc32 = zlib.crc32(data, self.crc32)
+        self.size += len(data)
+        await run_in_threadpool(self.spool.write, data)
+
+    def result(self, filename: Optional[str] = None) -> DigestResult:
+        return DigestResult(
+            filename=filename,
+            size=self.size,
+            sha256=self.sha256.hexdigest(),
+            crc32=f"{self.crc32:08x}",
+            spooled_to_disk=getattr(self.spool, "_rolled", False),
+        )
+
+    async def close(self):
+        await run_in_threadpool(self.spool.close)
+
+def ingest_file(file: UploadFile, queued_at: float, duplicate: bool = False) -> IngestResult:
+    # Runs on ingest_executor: validate, hash and persist a single upload.
+    # Failures are reported in the result rather than failing the batch.
+    started = time.perf_counter()
+    sha256 = hashlib.sha256()
+    size = 0
+    error = None
+
+    filename = os.path.basename(file.filename or "")
+    if not filename:
+        error = "Missing filename"
+    elif not is_safe_filename(filename):
+        error = "Invalid filename"
+    elif duplicate:
+        error = "Duplicate filename in batch"
+    else:
+        file_location = f"{UPLOAD_DIR}/{filename}"
+        partial_location = temp_location(file_location)
+        try:
+            with open(partial_location, "wb") as file_object:
+                while chunk := file.file.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > INGEST_MAX_FILE_SIZE:
+                        error = f"File exceeds {INGEST_MAX_FILE_SIZE} bytes"
+                        break
+                    sha256.update(chunk)
+                    file_object.write(chunk)
+            if not error:
+                os.replace(partial_location, file_location)
+        except OSError as exc:
+            error = f"Could not store file: {exc.strerror or exc}"
+        if error and os.path.exists(partial_location):
+            os.remove(partial_location)
+
+    return IngestResult(
+        filename=filename or None,
+        size=size,
+        sha256=None if error else sha256.hexdigest(),
+        queued_ms=round((started - queued_at) * 1000, 3),
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+        error=error,
+    )
+
+def add_range(ranges: List[Tuple[int, int]], start: int, end: int) -> List[Tuple[int, int]]:
+    # Insert [start, end) into a sorted list of disjoint ranges, merging overlaps
+    merged = []
+    for range_start, range_end in sorted(ranges + [(start, end)]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+        else:
+            merged.append((range_start, range_end))
+    return merged
+
+def missing_ranges(ranges: List[Tuple[int, int]], size: int) -> List[Tuple[int, int]]:
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append((position, start))
+        position = max(position, end)
+    if position < size:
+        missing.append((position, size))
+    return missing
+
+def is_upload_id(value: str) -> bool:
+    return len(value) == 32 and all(c in "0123456789abcdef" for c in value)
+
+def save_upload_state(upload_id: str, state: dict):
+    # fsync the data before recording its ranges, then replace the state
+    # file atomically. Concurrent chunks may save out of order; that can only
+    # under-report ranges, which the client then sends again.
+    partial_location = f"{PARTIAL_DIR}/{upload_id}"
+    with open(partial_location, "rb+") as file_object:
+        os.fsync(file_object.fileno())
+    state_location = temp_location(f"{partial_location}.json")
+    with open(state_location, "w") as file_object:
+        json.dump(state, file_object)
+    os.replace(state_location, f"{partial_location}.json")
+
+def load_upload_state(upload_id: str) -> Optional[dict]:
+    partial_location = f"{PARTIAL_DIR}/{upload_id}"
+    if not os.path.exists(partial_location):
+        return None
+    try:
+        with open(f"{partial_location}.json") as file_object:
+            state = json.load(file_object)
+    except FileNotFoundError:
+        return None
+    state["ranges"] = [tuple(r) for r in state["ranges"]]
+    return state
+
+def upload_state(upload: dict) -> dict:
+    keys = ("filename", "size", "description", "sha256", "ranges")
+    return {key: upload[key] for key in keys}
+
+async def get_resumable_upload(upload_id: str) -> dict:
+    if upload_id not in resumable_uploads and is_upload_id(upload_id):
+        state = await run_in_threadpool(load_upload_state, upload_id)
+        if state is not None and upload_id not in resumable_uploads:
+            resumable_uploads[upload_id] = {**state, "writers": 0, "finalizing": False}
+    if upload_id not in resumable_uploads:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return resumable_uploads[upload_id]
+
+def resumable_status(upload_id: str, upload: dict) -> dict:
+    missing = missing_ranges(upload["ranges"], upload["size"])
+    return {
+        "upload_id": upload_id,
+        "filename": upload["filename"],
+        "size": upload["size"],
+        "received": sum(end - start for start, end in upload["ranges"]),
+        "missing": missing,
+        "complete": not missing,
+    }
+
+def set_upload_headers(response: Response, upload_status: dict):
+    # tus-style headers: Upload-Offset is the first byte the server still needs
+    missing = upload_status["missing"]
+    response.headers["Upload-Offset"] = str(missing[0][0] if missing else upload_status["size"])
+    response.headers["Upload-Length"] = str(upload_status["size"])
+
+def stale_uploads(max_age: float) -> List[str]:
+    # Upload ids whose data and state files have both been idle for max_age
+    # seconds. A data file without state (crash during create) counts too.
+    if not os.path.isdir(PARTIAL_DIR):
+        return []
+    cutoff = time.time() - max_age
+    last_change = {}
+    for entry in os.scandir(PARTIAL_DIR):
+        upload_id = entry.name.removesuffix(".json")
+        if is_upload_id(upload_id):
+            last_change[upload_id] = max(last_change.get(upload_id, 0), entry.stat().st_mtime)
+    return [upload_id for upload_id, changed in last_change.items() if changed < cutoff]
+
+def remove_upload_files(upload_id: str):
+    # State first: without it a lookup no longer reloads the upload
+    for location in (f"{PARTIAL_DIR}/{upload_id}.json", f"{PARTIAL_DIR}/{upload_id}"):
+        try:
+            os.remove(location)
+        except FileNotFoundError:
+            pass
+
+async def expire_resumable_uploads(max_age: float = RESUMABLE_EXPIRE_SECONDS) -> int:
+    expired = 0
+    for upload_id in await run_in_threadpool(stale_uploads, max_age):
+        upload = resumable_uploads.get(upload_id)
+        if upload is not None and (upload["writers"] or upload["finalizing"]):
+            continue  # A slow chunk is still arriving
+        resumable_uploads.pop(upload_id, None)
+        await run_in_threadpool(remove_upload_files, upload_id)
+        expired += 1
+    return expired
+
+def create_sparse_file(path: str, size: int):
+    # truncate() extends the file without writing data, so it stays sparse
+    with open(path, "wb") as file_object:
+        file_object.truncate(size)
+
+def commit_file(partial_location: str, file_location: str, sha256: Optional[str]):
+    if sha256 is not None:
+        digest = hashlib.sha256()
+        with open(partial_location, "rb") as file_object:
+            while chunk := file_object.read(CHUNK_SIZE):
+                digest.update(chunk)
+        if digest.hexdigest() != sha256.lower():
+            raise HTTPException(status_code=409, detail="Checksum mismatch")
+    with open(partial_location, "rb+") as file_object:
+        os.fsync(file_object.fileno())
+    os.replace(partial_location, file_location)
+
+def blob_path(sha256: str) -> str:
+    # Two levels of 256-way sharding keep every directory small
+    return f"{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+def is_sha256(value: str) -> bool:
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+@contextmanager
+def blob_index():
+    # BEGIN IMMEDIATE serializes writers, so a refcount and the blob file it
+    # counts are always changed together
+    os.makedirs(BLOB_ROOT, exist_ok=True)
+    connection = sqlite3.connect(BLOB_INDEX_PATH, isolation_level=None)
+    try:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, refcount INTEGER NOT NULL)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "id TEXT PRIMARY KEY, sha256 TEXT NOT NULL REFERENCES blobs (sha256), "
+            "filename TEXT NOT NULL, content_type TEXT, description TEXT)"
+        )
+        connection.execute("BEGIN IMMEDIATE")
+        yield connection
+        connection.execute("COMMIT")
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+
+def store_blob(temp_location: Optional[str], upload: dict) -> bool:
+    # Returns True when the content was already stored
+    with blob_index() as connection:
+        known = connection.execute(
+            "SELECT 1 FROM blobs WHERE sha256 = ?", (upload["sha256"],)
+        ).fetchone() is not None
+        if known:
+            connection.execute(
+                "UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?", (upload["sha256"],)
+            )
+        else:
+            if temp_location is None:
+                raise HTTPException(status_code=409, detail="Blob disappeared, upload again")
+            location = blob_path(upload["sha256"])
+            os.makedirs(os.path.dirname(location), exist_ok=True)
+            os.replace(temp_location, location)
+            connection.execute(
+                "INSERT INTO blobs VALUES (?, ?, 1)", (upload["sha256"], upload["size"])
+            )
+        connection.execute(
+            "INSERT INTO uploads VALUES (:id, :sha256, :filename, :content_type, :description)",
+            upload,
+        )
+    if known and temp_location is not None:
+        os.remove(temp_location)
+    return known
+
+def read_stored_upload(upload_id: str) -> Optional[dict]:
+    with blob_index() as connection:
+        connection.row_factory = sqlite3.Row
+        row = connection.execute(
+            "SELECT uploads.*, blobs.size FROM uploads JOIN blobs USING (sha256) WHERE id = ?",
+            (upload_id,),
+        ).fetchone()
+    return dict(row) if row is not None else None
+
+def delete_stored_upload(upload_id: str) -> bool:
+    with blob_index() as connection:
+        row = connection.execute(
+            "SELECT sha256 FROM uploads WHERE id = ?", (upload_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        connection.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+        connection.execute(
+            "UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", row
+        )
+        if connection.execute(
+            "DELETE FROM blobs WHERE sha256 = ? AND refcount <= 0", row
+        ).rowcount:
+            os.remove(blob_path(row[0]))
+    return True
+
+def parse_range_header(http_range: str, size: int) -> List[Tuple[int, int]]:
+    # Returns merged [start, end) ranges; an empty list means "send everything"
+    units, _, spec = http_range.partition("=")
+    parts = spec.split(",")
+    if units.strip().lower() != "bytes" or len(parts) > MAX_RANGES:
+        return []
+
+    ranges = []
+    for part in parts:
+        first, separator, last = part.strip().partition("-")
+        try:
+            if not separator or not (first or last):
+                return []
+            if first:
+                start = int(first)
+                end = min(int(last) + 1, size) if last else size
+                if last and int(last) < start:
+                    return []
+            else:
+                start, end = max(size - int(last), 0), size
+        except ValueError:
+            return []
+        if start < end:
+            ranges = add_range(ranges, start, end)
+
+    if not ranges:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return ranges
+
+def read_at(file_object, offset: int, size: int) -> bytes:
+    file_object.seek(offset)
+    return file_object.read(size)
+
+class BlobResponse(Response):
+    """Sends a stored blob, optionally as one or more byte ranges.
+
+    When the server supports the ASGI zero-copy extension the open file is
+    handed over and the server sendfile()s it; otherwise the ranges are read
+    in CHUNK_SIZE pieces on the threadpool.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        etag: str,
+        filename: str,
+        media_type: Optional[str] = None,
+        ranges: List[Tuple[int, int]] = (),
+    ):
+        self.path = path
+        self.media_type = media_type or "application/octet-stream"
+        self.background = None
+        self.segments = []  # (part header, start, end)
+        self.trailer = b""
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "content-disposition": f"attachment; filename*=utf-8''{quote(filename)}",
+        }
+
+        if not ranges:
+            self.status_code = 200
+            self.segments.append((b"", 0, size))
+            headers["content-length"] = str(size)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            self.segments.append((b"", start, end))
+            headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            headers["content-length"] = str(end - start)
+        else:
+            self.status_code = 206
+            boundary = secrets.token_hex(13)
+            for start, end in ranges:
+                part_header = (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {self.media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                if self.segments:
+                    part_header = b"\r\n" + part_header
+                self.segments.append((part_header, start, end))
+            self.trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+            headers["content-length"] = str(
+                sum(len(part_header) + end - start for part_header, start, end in self.segments)
+                + len(self.trailer)
+            )
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if self.status_code == 200 and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            return
+
+        zerocopy = "http.response.zerocopysend" in extensions
+        file_object = await run_in_threadpool(open, self.path, "rb")
+        try:
+            for part_header, start, end in self.segments:
+                if part_header:
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": file_object,
+                        "offset": start,
+                        "count": end - start,
+                        "more_body": True,
+                    })
+                    continue
+                while start < end:
+                    chunk = await run_in_threadpool(read_at, file_object, start, min(CHUNK_SIZE, end - start))
+                    if not chunk:
+                        raise RuntimeError(f"Blob at {self.path} is shorter than expected")
+                    start += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+        finally:
+            await run_in_threadpool(file_object.close)
+
+async def expire_resumable_uploads_periodically():
+    while True:
+        await asyncio.sleep(RESUMABLE_SWEEP_SECONDS)
+        await expire_resumable_uploads()
+
+background_jobs = set()
+
+@app.on_event("startup")
+async def start_resumable_expiry():
+    background_jobs.add(asyncio.create_task(expire_resumable_uploads_periodically()))
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for job in background_jobs:
+        job.cancel()
+    background_jobs.clear()
+
+# Buffers the whole upload as bytes; see /files/digest/ for large files
 @app.post("/files/")
 async def create_file(file: bytes = File(...)):
     return {"file_size": len(file)}
@@ -19,19 +682,366 @@ async def upload_file(
     description: Optional[str] = Form(None)
 ):
     # Create uploads directory if it doesn't exist
-    os.makedirs("uploads", exist_ok=True)
-    
-    # Save the file
-    file_location = f"uploads/{file.filename}"
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    # Save the file without blocking the event loop
+    file_location = f"{UPLOAD_DIR}/{file.filename}"
     with open(file_location, "wb+") as file_object:
-        shutil.copyfileobj(file.file, file_object)
-    
+        await run_in_threadpool(shutil.copyfileobj, file.file, file_object)
+
     return {
         "filename": file.filename,
         "description": description,
         "content_type": file.content_type
     }
 
+@app.post("/files/upload/stream/", response_model=UploadStats)
+async def upload_file_stream(request: Request):
+    # Same form fields as /files/upload/, but the body is written to disk
+    # chunk by chunk while it is still arriving
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    started = time.perf_counter()
+
+    writer = None
+    upload = None
+    file_complete = False  # Set once the file part has ended and the writer is flushed
+    fields = {}
+    target = None  # Where the current part goes: writer, a field buffer or nowhere
+    try:
+        async for event, value in iter_multipart(request):
+            if event == "begin":
+                field_name, filename, content_type = value
+                if field_name == "file" and filename and writer is None:
+                    if not is_safe_filename(filename):
+                        raise HTTPException(
+                            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Invalid filename"
+                        )
+                    file_location = f"{UPLOAD_DIR}/{filename}"
+                    writer = ChunkedFileWriter(temp_location(file_location))
+                    await writer.open()
+                    upload = {"filename": filename, "content_type": content_type}
+                    target = writer
+                elif filename is None:
+                    target = fields[field_name] = bytearray()
+                else:
+                    target = None  # Only the first file part is stored
+            elif event == "data" and target is writer:
+                await writer.write(value)
+            elif event == "data" and target is not None:
+                if len(target) + len(value) > MAX_FIELD_SIZE:
+                    raise HTTPException(status_code=413, detail="Form field too large")
+                target.extend(value)
+            elif event == "end":
+                if target is writer:
+                    await writer.close()
+                    file_complete = True
+                target = None
+
+        if upload is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Missing file part"
+            )
+        if not file_complete:
+            # Never rename a partly written file over an existing upload
+            raise HTTPException(status_code=400, detail="Incomplete file part")
+        await run_in_threadpool(os.replace, writer.path, file_location)
+    except BaseException:
+        # Client disconnects and rejected bodies leave nothing behind
+        if writer is not None:
+            await writer.discard()
+        raise
+
+    elapsed = time.perf_counter() - started
+    description = fields.get("description")
+    return {
+        **upload,
+        "description": description.decode() if description is not None else None,
+        "size": writer.size,
+        "chunks": writer.chunks,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "throughput_mb_s": round(writer.size / (1024 * 1024) / elapsed, 3) if elapsed else 0.0,
+    }
+
+# Resumable uploads: init, PATCH chunks at explicit offsets, check status
+# to find the missing ranges, then finalize into uploads/{filename}. Uploads
+# idle for RESUMABLE_EXPIRE_SECONDS are swept by a background task.
+@app.post(
+    "/files/upload/resumable/",
+    response_model=ResumableUploadStatus,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_resumable_upload(upload: ResumableUploadCreate):
+    # Checked now: an upload that can never be finalized is never created
+    filename = os.path.basename(upload.filename)
+    if not is_safe_filename(filename):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid filename"
+        )
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    state = {**upload.dict(), "filename": filename, "ranges": []}
+    try:
+        await run_in_threadpool(create_sparse_file, f"{PARTIAL_DIR}/{upload_id}", upload.size)
+        await run_in_threadpool(save_upload_state, upload_id, state)
+    except BaseException:
+        await run_in_threadpool(remove_upload_files, upload_id)
+        raise
+    resumable_uploads[upload_id] = {**state, "writers": 0, "finalizing": False}
+    return resumable_status(upload_id, resumable_uploads[upload_id])
+
+@app.patch("/files/upload/resumable/{upload_id}", response_model=ResumableUploadStatus)
+async def write_resumable_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., ge=0),
+):
+    upload = await get_resumable_upload(upload_id)
+    if upload["finalizing"]:
+        raise HTTPException(status_code=409, detail="Upload is being finalized")
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        if not content_length.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+        if upload_offset + int(content_length) > upload["size"]:
+            raise HTTPException(status_code=413, detail="Chunk exceeds upload size")
+
+    # Finalize waits for writers to drain, so nothing writes into the
+    # partial file after it has been renamed
+    upload["writers"] += 1
+    writer = ChunkedFileWriter(f"{PARTIAL_DIR}/{upload_id}", offset=upload_offset)
+    try:
+        await writer.open()
+        async for chunk in request.stream():
+            if upload_offset + writer.size + len(writer.buffer) + len(chunk) > upload["size"]:
+                raise HTTPException(status_code=413, detail="Chunk exceeds upload size")
+            await writer.write(chunk)
+    finally:
+        # Keep whatever arrived before a disconnect so the client only
+        # has to resend the rest
+        try:
+            if writer.file is not None:
+                await writer.close()
+            if writer.size:
+                upload["ranges"] = add_range(upload["ranges"], upload_offset, upload_offset + writer.size)
+                await run_in_threadpool(save_upload_state, upload_id, upload_state(upload))
+        finally:
+            upload["writers"] -= 1
+
+    upload_status = resumable_status(upload_id, upload)
+    set_upload_headers(response, upload_status)
+    return upload_status
+
+@app.get("/files/upload/resumable/{upload_id}", response_model=ResumableUploadStatus)
+async def read_resumable_upload(upload_id: str, response: Response):
+    upload_status = resumable_status(upload_id, await get_resumable_upload(upload_id))
+    set_upload_headers(response, upload_status)
+    return upload_status
+
+@app.post("/files/upload/resumable/{upload_id}/finalize")
+async def finalize_resumable_upload(upload_id: str):
+    upload = await get_resumable_upload(upload_id)
+    if upload["finalizing"] or upload["writers"]:
+        raise HTTPException(status_code=409, detail="Upload is being written or finalized")
+    upload_status = resumable_status(upload_id, upload)
+    if not upload_status["complete"]:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Upload is incomplete", "missing": upload_status["missing"]}
+        )
+
+    # Atomic rename: readers never see a half-written file
+    upload["finalizing"] = True
+    try:
+        await run_in_threadpool(
+            commit_file,
+            f"{PARTIAL_DIR}/{upload_id}",
+            f"{UPLOAD_DIR}/{upload['filename']}",
+            upload["sha256"],
+        )
+    except BaseException:
+        upload["finalizing"] = False  # e.g. checksum mismatch: chunks can be resent
+        raise
+    del resumable_uploads[upload_id]
+    await run_in_threadpool(os.remove, f"{PARTIAL_DIR}/{upload_id}.json")
+    return {
+        "filename": upload["filename"],
+        "description": upload["description"],
+        "size": upload["size"],
+    }
+
+# Content-addressed store: identical content is kept once and every upload
+# gets its own stable id. Clients that already know the SHA-256 can send it
+# in X-Content-SHA256; if the blob exists the body is only hashed, not written.
+@app.post("/files/store/", response_model=StoredUpload, status_code=status.HTTP_201_CREATED)
+async def store_file(
+    request: Request,
+    x_content_sha256: Optional[str] = Header(None, min_length=64, max_length=64),
+):
+    os.makedirs(f"{BLOB_DIR}/.tmp", exist_ok=True)
+    expected = x_content_sha256.lower() if x_content_sha256 else None
+    if expected is not None and not is_sha256(expected):
+        raise HTTPException(status_code=400, detail="Invalid X-Content-SHA256 header")
+    skip_write = expected is not None and await run_in_threadpool(
+        os.path.exists, blob_path(expected)
+    )
+
+    sha256 = hashlib.sha256()
+    writer = None
+    upload = None
+    file_complete = False  # Set once the file part has ended and the blob is flushed
+    fields = {}
+    target = None  # Where the current part goes: the blob, a field buffer or nowhere
+    try:
+        async for event, value in iter_multipart(request):
+            if event == "begin":
+                field_name, filename, content_type = value
+                if field_name == "file" and filename and upload is None:
+                    upload = {"filename": filename, "content_type": content_type, "size": 0}
+                    if not skip_write:
+                        writer = ChunkedFileWriter(f"{BLOB_DIR}/.tmp/{uuid.uuid4().hex}")
+                        await writer.open()
+                    target = upload
+                elif filename is None:
+                    target = fields[field_name] = bytearray()
+                else:
+                    target = None  # Only the first file part is stored
+            elif event == "data" and target is upload:
+                sha256.update(value)
+                upload["size"] += len(value)
+                if writer is not None:
+                    await writer.write(value)
+            elif event == "data" and target is not None:
+                if len(target) + len(value) > MAX_FIELD_SIZE:
+                    raise HTTPException(status_code=413, detail="Form field too large")
+                target.extend(value)
+            elif event == "end":
+                if target is upload:
+                    if writer is not None:
+                        await writer.close()
+                    file_complete = True
+                target = None
+
+        if upload is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Missing file part"
+            )
+        if not file_complete:
+            # The hash covers bytes that may still be buffered in the writer
+            raise HTTPException(status_code=400, detail="Incomplete file part")
+        upload["sha256"] = sha256.hexdigest()
+        if expected is not None and upload["sha256"] != expected:
+            raise HTTPException(status_code=409, detail="Checksum mismatch")
+
+        description = fields.get("description")
+        upload["description"] = description.decode() if description is not None else None
+        upload["id"] = uuid.uuid4().hex
+        deduplicated = await run_in_threadpool(
+            store_blob, writer.path if writer is not None else None, upload
+        )
+    except BaseException:
+        # Disconnects, rejected bodies and failed index updates leave no
+        # temp blob behind (store_blob moves or removes it on success)
+        if writer is not None and os.path.exists(writer.path):
+            await writer.discard()
+        raise
+    return {**upload, "deduplicated": deduplicated}
+
+@app.get("/files/store/{upload_id}", response_model=StoredUpload)
+async def read_stored_file(upload_id: str):
+    upload = await run_in_threadpool(read_stored_upload, upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+@app.api_route("/files/store/{upload_id}/content", methods=["GET", "HEAD"])
+async def download_stored_file(upload_id: str, request: Request):
+    upload = await run_in_threadpool(read_stored_upload, upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    # The content hash is a strong validator: equal ETags mean equal bytes
+    etag = f'"{upload["sha256"]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    ranges = []
+    http_range = request.headers.get("range")
+    if http_range and request.headers.get("if-range", etag) == etag:
+        ranges = parse_range_header(http_range, upload["size"])
+
+    return BlobResponse(
+        blob_path(upload["sha256"]),
+        upload["size"],
+        etag,
+        upload["filename"],
+        upload["content_type"],
+        ranges,
+    )
+
+@app.delete("/files/store/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_stored_file(upload_id: str):
+    if not await run_in_threadpool(delete_stored_upload, upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@app.post("/files/multiple/ingest/", response_model=List[IngestResult])
+async def ingest_files(files: list[UploadFile] = File(...)):
+    # Persist, hash and validate every file on the bounded ingest pool.
+    # The semaphore keeps one large batch from occupying every worker.
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(INGEST_MAX_PER_REQUEST)
+
+    async def ingest(file: UploadFile, duplicate: bool):
+        queued_at = time.perf_counter()
+        async with semaphore:
+            return await loop.run_in_executor(ingest_executor, ingest_file, file, queued_at, duplicate)
+
+    # Files sharing a name would race for the same path: the first one wins
+    # and the rest are reported as errors
+    seen = set()
+    duplicates = []
+    for file in files:
+        filename = os.path.basename(file.filename or "")
+        duplicates.append(filename in seen)
+        seen.add(filename)
+
+    # gather() keeps the results in upload order
+    return await asyncio.gather(*(ingest(file, duplicate) for file, duplicate in zip(files, duplicates)))
+
+@app.post("/files/digest/", response_model=List[DigestResult])
+async def digest_files(request: Request):
+    # Digest every file part of a multipart upload without buffering it
+    results = []
+    digest = None
+    filename = None
+    async for event, value in iter_multipart(request):
+        if event == "begin":
+            _, filename, _ = value
+            digest = StreamDigest() if filename else None
+        elif event == "data" and digest is not None:
+            await digest.update(value)
+        elif event == "end" and digest is not None:
+            results.append(digest.result(filename))
+            await digest.close()
+            digest = None
+    return results
+
+@app.post("/files/digest/raw/", response_model=DigestResult)
+async def digest_body(request: Request, filename: Optional[str] = None):
+    # Digest a raw (non-multipart) request body
+    digest = StreamDigest()
+    try:
+        async for chunk in request.stream():
+            await digest.update(chunk)
+        return digest.result(filename)
+    finally:
+        await digest.close()
+
 @app.post("/files/multiple/")
 async def create_files(
     files: list[UploadFile] = File(...),
@@ -40,4 +1050,86 @@ async def create_files(
     return {
         "filenames": [file.filename for file in files],
         "description": description
-    } 
\ No newline at end of file
+    }
+
+# Memory benchmark: peak Python allocations while digesting uploads of
+# growing size, StreamDigest vs. buffering the whole body as bytes
+async def benchmark_digest_memory(sizes_mb=(1, 16, 64, 256), chunk_size=64 * 1024):
+    chunk = os.urandom(chunk_size)
+
+    async def body(size_mb):
+        for _ in range(size_mb * 1024 * 1024 // chunk_size):
+            yield chunk
+
+    print(f"{'size':>8} {'bytes peak':>12} {'stream peak':>12}")
+    for size_mb in sizes_mb:
+        tracemalloc.start()
+        parts = [part async for part in body(size_mb)]
+        len(b"".join(parts))
+        _, buffered_peak = tracemalloc.get_traced_memory()
+        del parts
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        digest = StreamDigest()
+        async for part in body(size_mb):
+            await digest.update(part)
+        digest.result()
+        await digest.close()
+        _, streamed_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{size_mb:>6}MB {buffered_peak / 2**20:>10.1f}MB {streamed_peak / 2**20:>10.1f}MB")
+
+# Download benchmark: plain FileResponse vs. BlobResponse reading chunks
+# vs. BlobResponse with a server that implements zero-copy send (simulated
+# here with os.sendfile() into /dev/null)
+async def benchmark_download(size_mb=256, rounds=3):
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    with TemporaryDirectory() as directory, open(os.devnull, "wb") as devnull:
+        path = f"{directory}/blob"
+        with open(path, "wb") as file_object:
+            for _ in range(size_mb):
+                file_object.write(os.urandom(1024 * 1024))
+
+        async def send(message):
+            if message["type"] == "http.response.zerocopysend":
+                offset, count = message["offset"], message["count"]
+                while count:
+                    sent = os.sendfile(devnull.fileno(), message["file"].fileno(), offset, count)
+                    offset += sent
+                    count -= sent
+
+        variants = {
+            "FileResponse": (lambda: FileResponse(path), {}),
+            "BlobResponse (chunks)": (lambda: BlobResponse(path, size_mb * 2**20, '"x"', "blob"), {}),
+            "BlobResponse (zero-copy)": (
+                lambda: BlobResponse(path, size_mb * 2**20, '"x"', "blob"),
+                {"http.response.zerocopysend": {}},
+            ),
+        }
+        print(f"{'variant':<26} {'MB/s':>8} {'peak alloc':>11}")
+        for name, (make_response, extensions) in variants.items():
+            scope = {
+                "type": "http",
+                "method": "GET",
+                "headers": [],
+                "asgi": {"spec_version": "2.4"},
+                "extensions": extensions,
+            }
+            started = time.perf_counter()
+            for _ in range(rounds):
+                await make_response()(scope, receive, send)
+            elapsed = time.perf_counter() - started
+
+            tracemalloc.start()
+            await make_response()(scope, receive, send)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:<26} {size_mb * rounds / elapsed:>8.0f} {peak / 2**20:>9.2f}MB")
+
+if __name__ == "__main__":
+    asyncio.run(benchmark_digest_memory())
+    asyncio.run(benchmark_download())
@@ -1,26 +1,364 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from typing import Optional, List
+from fastapi import FastAPI, Depends, Header, HTTPException, Response, status
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from typing import Optional, List, Literal
 from pydantic import BaseModel
+from functools import wraps
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import hashlib
+import heapq
+import hmac
+import inspect
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: worker ids fall back to the pid
+    fcntl = None
 
 app = FastAPI()
 
+# Settings
+# Opt-in: instruments every dependency and mounts /debug/dependencies
+PROFILE_DEPENDENCIES = os.getenv("PROFILE_DEPENDENCIES", "false").lower() in ("1", "true")
+WORKER_BITS = 10  # Up to 1024 worker processes per host
+WORKER_LOCK_DIR = os.getenv("WORKER_LOCK_DIR", tempfile.gettempdir())
+API_TOKENS = os.getenv("API_TOKENS", "fake-super-secret-token").split(",")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
+
+# Full-text search: an inverted index from lowercase tokens to item ids, with
+# a sorted vocabulary so the terms sharing a prefix are found by bisection
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+class InvertedIndex:
+    def __init__(self):
+        self.postings = {}  # token -> {id: occurrences}
+        self.vocabulary = []  # Sorted tokens
+        self.size = 0
+
+    def add(self, doc_id, text: str):
+        self.size += 1
+        for token in tokenize(text):
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                insort(self.vocabulary, token)
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+
+    def bulk_add(self, documents):
+        # Same as add() for each (id, text), sorting the vocabulary once
+        for doc_id, text in documents:
+            self.size += 1
+            for token in tokenize(text):
+                postings = self.postings.setdefault(token, {})
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+        self.vocabulary = sorted(self.postings)
+
+    def expand(self, prefix: str) -> List[str]:
+        # Every token with the prefix, found as one contiguous run of the
+        # vocabulary; no word character sorts after U+10FFFF
+        start = bisect_left(self.vocabulary, prefix)
+        stop = bisect_left(self.vocabulary, prefix + "\U0010ffff", start)
+        return self.vocabulary[start:stop]
+
+    def search(self, query: str, limit: int, skip: int = 0) -> list:
+        # Every query term must match a token exactly or as a prefix. A term
+        # scores the idf of its best matching token, halved for a prefix
+        # match; scores add up across terms and ties go to the lowest id.
+        expansions = [self.expand(term) for term in tokenize(query)]
+        if not expansions or not all(expansions):
+            return []
+        terms = sorted(
+            zip(tokenize(query), expansions),
+            key=lambda entry: sum(len(self.postings[token]) for token in entry[1]),
+        )
+        scores = None
+        for term, tokens in terms:  # Rarest first, so the candidate set stays small
+            weighted = sorted(
+                (
+                    (1.0 if token == term else 0.5) * math.log(1 + self.size / len(self.postings[token])),
+                    token,
+                )
+                for token in tokens
+            )
+            matches = {}
+            for weight, token in weighted:  # Lightest first, so the best weight is written last
+                postings = self.postings[token].keys()
+                if scores is not None:
+                    postings = postings & scores.keys()
+                matches.update(dict.fromkeys(postings, weight))
+            if scores is not None:
+                matches = {doc_id: scores[doc_id] + score for doc_id, score in matches.items()}
+            scores = matches
+            if not scores:
+                return []
+        # nlargest is stable, so feeding ids in order breaks ties by lowest id
+        return heapq.nlargest(skip + limit, sorted(scores), key=scores.__getitem__)[skip:]
+
+# In-memory item store: items kept in id order plus sorted (value, id)
+# indexes, so a page is a binary search followed by a slice
+class ItemStore:
+    def __init__(self, items=None, indexed=("price", "name"), searchable="name"):
+        self.items = {}  # id -> item
+        self.ids = []  # Sorted ids
+        self.indexes = {field: [] for field in indexed}  # field -> sorted (value, id)
+        self.searchable = searchable
+        self.search_index = InvertedIndex()
+        self.lock = threading.Lock()  # Writers may run in the threadpool
+        if items:
+            self.bulk_load(items)
+
+    def __contains__(self, item_id):
+        return item_id in self.items
+
+    def __getitem__(self, item_id):
+        return self.items[item_id]
+
+    def __len__(self):
+        return len(self.items)
+
+    def values(self):
+        return (self.items[item_id] for item_id in self.ids)
+
+    def insert(self, item_id: int, item: dict):
+        # Appending a new highest id is O(log n); other positions pay a memmove
+        with self.lock:
+            if item_id in self.items:
+                raise KeyError(f"Duplicate item id {item_id}")
+            self.items[item_id] = item
+            insort(self.ids, item_id)
+            for field, index in self.indexes.items():
+                insort(index, (item[field], item_id))
+            self.search_index.add(item_id, item[self.searchable])
+
+    def bulk_load(self, items: dict):
+        # Sort once instead of inserting one by one
+        with self.lock:
+            self.items.update(items)
+            self.ids = sorted(self.items)
+            for field in self.indexes:
+                self.indexes[field] = sorted((item[field], item_id) for item_id, item in self.items.items())
+            self.search_index.bulk_add((item_id, item[self.searchable]) for item_id, item in items.items())
+
+    def page(self, limit: int, after: Optional[int] = None, sort: str = "id", skip: int = 0):
+        # Ids of the page that follows the cursor item in the given order
+        if sort == "id":
+            start = 0 if after is None else bisect_right(self.ids, after)
+            return self.ids[start + skip : start + skip + limit]
+        index = self.indexes[sort]
+        if after is None:
+            start = 0
+        else:
+            start = bisect_right(index, (self.items[after][sort], after))
+        return [item_id for _, item_id in index[start + skip : start + skip + limit]]
+
+    def search(self, query: str, limit: int, skip: int = 0):
+        return self.search_index.search(query, limit, skip)
+
 # Database simulation
-fake_items_db = {
-    "1": {"name": "Item 1", "price": 10.5},
-    "2": {"name": "Item 2", "price": 20.0},
-    "3": {"name": "Item 3", "price": 15.0}
-}
+fake_items_db = ItemStore({
+    1: {"name": "Item 1", "price": 10.5},
+    2: {"name": "Item 2", "price": 20.0},
+    3: {"name": "Item 3", "price": 15.0}
+})
+
+# ID allocation: ids are (sequence << WORKER_BITS) | worker id. next() on an
+# itertools.count is atomic, so allocating takes no lock, and the worker id
+# keeps separate uvicorn/gunicorn worker processes from colliding.
+def lock_worker_slot(worker_id: int):
+    lock_file = open(os.path.join(WORKER_LOCK_DIR, f"12dependencies-worker-{worker_id}.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def claim_worker_id(forked: bool = False):
+    # WORKER_ID wins, but only in the process it was set for: forked children
+    # inherit the variable and would all reuse it. Slots are flocks held for
+    # the life of the process (the kernel releases them if the worker dies).
+    if os.getenv("WORKER_ID") and not forked:
+        worker_id = int(os.environ["WORKER_ID"])
+        if worker_id not in range(1 << WORKER_BITS):
+            # A larger id would spill into the sequence bits and collide
+            raise ValueError(f"WORKER_ID must be between 0 and {(1 << WORKER_BITS) - 1}, got {worker_id}")
+        if fcntl is None:
+            return worker_id, None
+        # Take its slot too, so forked children never claim the same id
+        lock_file = lock_worker_slot(worker_id)
+        if lock_file is None:
+            raise RuntimeError(f"WORKER_ID {worker_id} is already in use on this host")
+        return worker_id, lock_file
+    if fcntl is None:
+        return os.getpid() % (1 << WORKER_BITS), None
+    for worker_id in range(1 << WORKER_BITS):
+        lock_file = lock_worker_slot(worker_id)
+        if lock_file is not None:
+            return worker_id, lock_file
+    raise RuntimeError("No free worker id")
+
+class IdAllocator:
+    def __init__(self, start: int = 1):
+        self.start = start
+        self.reset()
+        if hasattr(os, "register_at_fork"):
+            # A forked worker (gunicorn --preload, multiprocessing) needs its own id
+            os.register_at_fork(after_in_child=lambda: self.reset(forked=True))
+
+    def reset(self, forked: bool = False):
+        self.worker_id, self.lock_file = claim_worker_id(forked)
+        self.sequence = itertools.count(self.start)
+
+    def __call__(self) -> int:
+        return (next(self.sequence) << WORKER_BITS) | self.worker_id
+
+allocate_id = IdAllocator(start=(max(fake_items_db.ids) >> WORKER_BITS) + 1)
+
+def add_item(item: dict) -> int:
+    # The only write path: a fresh id and a locked insert, with no await in between
+    item_id = allocate_id()
+    fake_items_db.insert(item_id, item)
+    return item_id
 
 class Item(BaseModel):
     name: str
     price: float
 
+# Dependency profiler: per route, self time of every node in the dependency graph
+dependency_stats = {}  # (route, node path) -> [calls, total seconds, max seconds]
+
+def route_key(route: APIRoute) -> str:
+    return f"{','.join(sorted(route.methods))} {route.path}"
+
+def node_name(call) -> str:
+    return getattr(call, "__name__", type(call).__name__)
+
+def timed_call(call, key):
+    # Sub-dependencies are solved before call runs, so this is self time
+    def record(started):
+        elapsed = time.perf_counter() - started
+        stats = dependency_stats.setdefault(key, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+    if asyncio.iscoroutinefunction(call) or asyncio.iscoroutinefunction(getattr(call, "__call__", None)):
+        async def timed(**values):
+            started = time.perf_counter()
+            try:
+                return await call(**values)
+            finally:
+                record(started)
+    else:
+        def timed(**values):
+            started = time.perf_counter()
+            try:
+                return call(**values)
+            finally:
+                record(started)
+    timed.__name__ = node_name(call)
+    return timed
+
+def instrument_dependencies(app: FastAPI):
+    # Swap every sub-dependency call for a timed wrapper. Call once, after all
+    # routes are registered; generator dependencies are left untouched.
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        wrapped = {}  # One wrapper per call keeps FastAPI's per-request cache working
+
+        def walk(dependant, path):
+            for sub in dependant.dependencies:
+                call = sub.call
+                node = path + (node_name(call),)
+                walk(sub, node)
+                if inspect.isgeneratorfunction(call) or inspect.isasyncgenfunction(call):
+                    continue
+                if call not in wrapped:
+                    wrapped[call] = timed_call(call, (route_key(route), node))
+                sub.call = wrapped[call]
+
+        walk(route.dependant, ())
+
+def dependency_tree(route: APIRoute) -> dict:
+    def node(dependant, path):
+        children = [
+            node(sub, path + (node_name(sub.call),)) for sub in dependant.dependencies
+        ]
+        calls, total, worst = dependency_stats.get((route_key(route), path), (0, 0.0, 0.0))
+        return {
+            "name": path[-1] if path else route_key(route),
+            "calls": calls,
+            "self_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / calls, 4) if calls else 0.0,
+            "max_ms": round(worst * 1000, 3),
+            "total_ms": round(total * 1000 + sum(child["total_ms"] for child in children), 3),
+            "children": children,
+        }
+
+    return node(route.dependant, ())
+
+# Cross-request memoization for expensive dependencies. A cached value is
+# served for up to ttl seconds, so only memoize results that may be that
+# stale. key receives the dependency's arguments and returns the cache key;
+# exceptions are not cached.
+def memoize_dependency(ttl: float, key=None, maxsize: int = 1024):
+    def decorator(func):
+        cache = {}  # cache key -> (expires at, value)
+
+        def lookup(values):
+            cache_key = key(**values) if key else tuple(sorted(values.items()))
+            entry = cache.get(cache_key)
+            if entry is not None and entry[0] > time.monotonic():
+                return cache_key, entry[1], True
+            return cache_key, None, False
+
+        def store(cache_key, value):
+            if cache_key not in cache and len(cache) >= maxsize:
+                cache.pop(next(iter(cache)))  # Oldest insertion first
+            cache[cache_key] = (time.monotonic() + ttl, value)
+            return value
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def memoized(**values):
+                cache_key, value, hit = lookup(values)
+                return value if hit else store(cache_key, await func(**values))
+        else:
+            @wraps(func)
+            def memoized(**values):
+                cache_key, value, hit = lookup(values)
+                return value if hit else store(cache_key, func(**values))
+        memoized.cache_clear = cache.clear
+        return memoized
+
+    return decorator
+
 # Common dependencies
 async def common_parameters(q: Optional[str] = None, skip: int = 0, limit: int = 100):
     return {"q": q, "skip": skip, "limit": limit}
 
-# Dependency for getting item
-async def get_item(item_id: str):
+# Dependency for getting item. Memoized: items are only ever added here, and
+# a 404 is not cached, so a new item is visible at once. An endpoint that
+# edited items would have to call get_item.cache_clear() or accept up to 5s
+# of stale reads.
+@memoize_dependency(ttl=5, key=lambda item_id: item_id)
+async def get_item(item_id: int):
     if item_id not in fake_items_db:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -28,19 +366,52 @@ async def get_item(item_id: str):
         )
     return fake_items_db[item_id]
 
-# Dependency for verifying token
-async def verify_token(token: str = Depends(lambda x: x.headers.get("X-Token"))):
-    if token != "fake-super-secret-token":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token"
-        )
-    return token
+# Dependency for verifying token: valid tokens are kept as SHA-256 digests
+# and compared in constant time; verdicts are cached in a small LRU keyed by
+# the digest, so repeated good or bad tokens skip the comparison
+class TokenVerifier:
+    def __init__(self, tokens: List[str], cache_size: int = TOKEN_CACHE_SIZE):
+        self.digests = [hashlib.sha256(token.encode()).digest() for token in tokens if token]
+        self.cache_size = cache_size
+        self.verdicts = OrderedDict()  # digest -> bool
+        self.stats = {"hits": 0, "misses": 0, "accepted": 0, "rejected": 0}
+
+    def check(self, token: str) -> bool:
+        digest = hashlib.sha256(token.encode()).digest()
+        valid = self.verdicts.get(digest)
+        if valid is not None:
+            self.stats["hits"] += 1
+            self.verdicts.move_to_end(digest)
+            return valid
+        self.stats["misses"] += 1
+        valid = False
+        for known in self.digests:  # No early exit: every token is compared
+            valid |= hmac.compare_digest(digest, known)
+        self.verdicts[digest] = valid
+        if len(self.verdicts) > self.cache_size:
+            self.verdicts.popitem(last=False)
+        return valid
+
+    async def __call__(self, x_token: Optional[str] = Header(None)):
+        if x_token is None or not self.check(x_token):
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token"
+            )
+        self.stats["accepted"] += 1
+        return x_token
+
+verify_token = TokenVerifier(API_TOKENS)
 
 # Routes using dependencies
 @app.get("/items/")
 async def read_items(commons: dict = Depends(common_parameters)):
-    return commons
+    if commons["q"]:
+        ids = fake_items_db.search(commons["q"], commons["limit"], commons["skip"])
+    else:
+        ids = fake_items_db.page(commons["limit"], skip=commons["skip"])
+    return {**commons, "items": [fake_items_db[item_id] for item_id in ids]}
 
 @app.get("/items/{item_id}")
 async def read_item(item: dict = Depends(get_item)):
@@ -48,17 +419,154 @@ async def read_item(item: dict = Depends(get_item)):
 
 @app.post("/items/", dependencies=[Depends(verify_token)])
 async def create_item(item: Item):
-    item_id = str(len(fake_items_db) + 1)
-    fake_items_db[item_id] = item.dict()
+    item_id = add_item(item.dict())
     return {"item_id": item_id, **item.dict()}
 
 # Class-based dependency
 class Pagination:
-    def __init__(self, skip: int = 0, limit: int = 10):
+    def __init__(
+        self,
+        skip: int = 0,
+        limit: int = 10,
+        after: Optional[int] = None,
+        sort: Literal["id", "price", "name"] = "id",
+    ):
         self.skip = skip
         self.limit = limit
+        self.after = after  # Keyset cursor: id of the last item already seen
+        self.sort = sort
 
 @app.get("/items/paginated/")
-async def read_items_paginated(pagination: Pagination = Depends()):
-    items = list(fake_items_db.values())
-    return items[pagination.skip : pagination.skip + pagination.limit] 
\ No newline at end of file
+async def read_items_paginated(response: Response, pagination: Pagination = Depends()):
+    if pagination.after is not None and pagination.after not in fake_items_db:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown cursor")
+    ids = fake_items_db.page(pagination.limit, pagination.after, pagination.sort, pagination.skip)
+    if len(ids) == pagination.limit and ids:
+        response.headers["X-Next-Cursor"] = str(ids[-1])
+    return [fake_items_db[item_id] for item_id in ids]
+
+# Debug endpoints need the same token as POST /items/
+@app.get("/debug/auth", dependencies=[Depends(verify_token)])
+async def auth_stats():
+    return {**verify_token.stats, "cached_verdicts": len(verify_token.verdicts)}
+
+# Profiler output, only mounted when profiling is on
+if PROFILE_DEPENDENCIES:
+    @app.get("/debug/dependencies", dependencies=[Depends(verify_token)])
+    async def dependency_profile():
+        return [dependency_tree(route) for route in app.routes if isinstance(route, APIRoute)]
+
+    @app.get(
+        "/debug/dependencies/flamegraph",
+        response_class=PlainTextResponse,
+        dependencies=[Depends(verify_token)],
+    )
+    async def dependency_flamegraph():
+        # Folded stacks (self time in microseconds) for flamegraph.pl or speedscope
+        return "\n".join(
+            ";".join((route,) + node) + f" {round(stats[1] * 1_000_000)}"
+            for (route, node), stats in sorted(dependency_stats.items())
+        )
+
+    instrument_dependencies(app)
+
+# Benchmark: deep pages with list slicing vs keyset seeks
+def benchmark_pagination(count=1_000_000, limit=100, rounds=20):
+    rng = random.Random(0)
+    started = time.perf_counter()
+    store = ItemStore({
+        item_id: {"name": f"Item {rng.randrange(count)}", "price": round(rng.uniform(1, 1000), 2)}
+        for item_id in range(1, count + 1)
+    })
+    print(f"Loaded {count:,} items and indexes in {time.perf_counter() - started:.2f}s")
+
+    def timed(label, fetch):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            page = fetch()
+        elapsed = (time.perf_counter() - started) / rounds
+        print(f"{label:<34} {elapsed * 1000:10.3f}ms  ({len(page)} items)")
+
+    deep = count - 2 * limit
+    timed("list slice, skip near end", lambda: list(store.values())[deep : deep + limit])
+    timed("keyset by id, after near end", lambda: store.page(limit, after=deep))
+    timed("keyset by price, after near end", lambda: store.page(limit, after=deep, sort="price"))
+    timed("keyset by name, after near end", lambda: store.page(limit, after=deep, sort="name"))
+    timed("keyset by id, first page", lambda: store.page(limit))
+
+# Benchmark: inverted index search vs a linear scan over every name
+def linear_search(store: ItemStore, query: str, limit: int):
+    terms = tokenize(query)
+    matches = []
+    for item_id in store.ids:
+        tokens = tokenize(store[item_id]["name"])
+        if all(any(token.startswith(term) for token in tokens) for term in terms):
+            matches.append(item_id)
+            if len(matches) == limit:
+                break
+    return matches
+
+def benchmark_search(count=100_000, limit=10, rounds=50):
+    rng = random.Random(0)
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "do", "gu"]
+    words = sorted({"".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(20_000)})
+    store = ItemStore({
+        item_id: {"name": " ".join(rng.choices(words, k=rng.randint(2, 4))), "price": 1.0}
+        for item_id in range(1, count + 1)
+    })
+    queries = [words[len(words) // 2], words[7][:4], f"{words[100]} {words[2000][:3]}", "zzz"]
+    print(f"{'query':<22} {'index':>10} {'linear scan':>12}")
+    for query in queries:
+        timings = []
+        for search in (store.search, lambda q, n: linear_search(store, q, n)):
+            started = time.perf_counter()
+            for _ in range(rounds):
+                search(query, limit)
+            timings.append((time.perf_counter() - started) / rounds * 1000)
+        print(f"{query!r:<22} {timings[0]:8.3f}ms {timings[1]:10.3f}ms")
+
+# Stress test: concurrent creates from the event loop, the threadpool and
+# forked worker processes must never share an id
+def allocate_ids(count):
+    return [allocate_id() for _ in range(count)]
+
+async def stress_create_items(count=10_000, processes=4):
+    before = len(fake_items_db)
+
+    async def create_in_loop(i):
+        return add_item({"name": f"Stress {i}", "price": float(i)})
+
+    def create_in_thread(i):
+        return add_item({"name": f"Stress {i}", "price": float(i)})
+
+    started = time.perf_counter()
+    ids = await asyncio.gather(*(
+        create_in_loop(i) if i % 2 else asyncio.to_thread(create_in_thread, i)
+        for i in range(count)
+    ))
+    elapsed = time.perf_counter() - started
+    assert len(set(ids)) == count, "Duplicate ids within one worker"
+    assert len(fake_items_db) == before + count
+    assert fake_items_db.ids == sorted(set(fake_items_db.ids))
+    print(f"{count:,} concurrent creates in {elapsed:.2f}s, 0 collisions")
+
+    # Forked children inherit WORKER_ID; each must still claim its own slot
+    context = multiprocessing.get_context("fork")
+    for worker_env in (None, str(allocate_id.worker_id)):
+        if worker_env is not None:
+            os.environ["WORKER_ID"] = worker_env
+        try:
+            with ProcessPoolExecutor(processes, mp_context=context) as pool:
+                batches = list(pool.map(allocate_ids, [count] * processes))
+        finally:
+            os.environ.pop("WORKER_ID", None)
+        worker_ids = {item_id for batch in batches for item_id in batch}
+        assert len(worker_ids) == count * processes, "Duplicate ids across workers"
+        assert not worker_ids & set(ids), "Worker ids collide with the parent"
+        print(f"{count * processes:,} ids from {processes} worker processes "
+              f"(WORKER_ID={worker_env}), 0 collisions")
+
+if __name__ == "__main__":
+    benchmark_pagination()
+    benchmark_search()
+    asyncio.run(stress_create_items())
\ No newline at end of file
@@ -1,14 +1,76 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy import create_engine, event, func, insert, inspect, select, Column, Integer, String, ForeignKey
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from fastapi import FastAPI, Depends, HTTPException, status
-from pydantic import BaseModel
-from typing import List, Optional
+from sqlalchemy.orm import sessionmaker, relationship, selectinload, load_only, noload
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError, create_model
+from typing import List, Optional, get_args
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
 
 # Database configuration
+DATABASE_MODE = os.getenv("DATABASE_MODE", "sync")  # "sync" or "async" (needs aiosqlite)
 SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./sql_app.db"
+
+# SQLite tuning profile, applied to every new connection. WAL lets readers
+# run alongside the single writer; synchronous=NORMAL skips the fsync on each
+# commit in WAL mode (a power loss can drop the last commits, a crash cannot
+# corrupt the database); busy_timeout makes writers queue for the write lock
+# instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,        # ms
+    "cache_size": -64000,        # negative means KiB: 64MB page cache per connection
+    "mmap_size": 268435456,      # 256MB of the file read through mmap
+    "temp_store": "MEMORY",
+}
+# A sync request keeps its connection while it waits for a threadpool thread
+# (response validation, get_db teardown), so a pool capped below the number
+# of requests in flight deadlocks until the pool timeout. pool_size keeps
+# one warm connection per threadpool thread (anyio's default is 40); bursts
+# beyond that open overflow connections, which are cheap for SQLite.
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", 40))
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def create_sqlite_engine(url: str, tuned: bool = True, **kwargs):
+    if url.startswith("sqlite+aiosqlite"):
+        engine = create_async_engine(url, **kwargs)
+        sync_engine = engine.sync_engine
+    else:
+        kwargs.setdefault("connect_args", {"check_same_thread": False})
+        if tuned:
+            kwargs.setdefault("pool_size", SQLITE_POOL_SIZE)
+            kwargs.setdefault("max_overflow", -1)
+        engine = sync_engine = create_engine(url, **kwargs)
+    if tuned:
+        event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+engine = create_sqlite_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The async engine is only created in async mode, so aiosqlite stays optional
+async_engine = create_sqlite_engine(ASYNC_SQLALCHEMY_DATABASE_URL) if DATABASE_MODE == "async" else None
+AsyncSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, class_=AsyncSession, bind=async_engine
+)
 Base = declarative_base()
 
 # SQLAlchemy models
@@ -43,7 +105,7 @@ class ItemBase(BaseModel):
 class ItemCreate(ItemBase):
     pass
 
-class Item(ItemBase):
+class ItemResponse(ItemBase):
     id: int
     owner_id: int
 
@@ -56,14 +118,26 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
 
-class User(UserBase):
+class UserResponse(UserBase):
     id: int
     is_active: bool
-    items: List[Item] = []
+    items: List[ItemResponse] = []
 
     class Config:
         orm_mode = True
 
+class BulkRowError(BaseModel):
+    index: int
+    errors: List[dict]
+
+class BulkResult(BaseModel):
+    created: int
+    ids: List[Optional[int]]  # One per input row, None where the row failed
+    errors: List[BulkRowError]
+
+# Number of rows fetched, validated and flushed at a time when streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -72,40 +146,839 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Streaming list responses
+def to_json(model, row) -> str:
+    # ORM row -> response model -> JSON text
+    if hasattr(model, "model_validate"):
+        return model.model_validate(row, from_attributes=True).model_dump_json()
+    return model.from_orm(row).json()
+
+async def iter_batches(items, batch_size: int):
+    # Async sources (request bodies) are batched as they arrive; sync ones
+    # (query results) are pulled batch_size rows at a time on the threadpool
+    if hasattr(items, "__aiter__"):
+        batch = []
+        async for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    else:
+        iterator = iter(items)
+        while batch := await run_in_threadpool(lambda: list(islice(iterator, batch_size))):
+            yield batch
+
+class StreamingListResponse(StreamingResponse):
+    """JSON array of query rows, encoded and sent batch_size rows at a time."""
+
+    def __init__(self, items, model, batch_size: int = STREAM_BATCH_SIZE, **kwargs):
+        super().__init__(
+            self.encode(items, model, batch_size), media_type="application/json", **kwargs
+        )
+
+    @staticmethod
+    async def encode(items, model, batch_size: int):
+        def encode_batch(batch):
+            return ",".join([to_json(model, item) for item in batch]).encode("utf-8")
+
+        try:
+            yield b"["
+            separator = b""
+            async for batch in iter_batches(items, batch_size):
+                yield separator + await run_in_threadpool(encode_batch, batch)
+                separator = b","
+            yield b"]"
+        finally:
+            if hasattr(items, "close"):
+                await run_in_threadpool(items.close)
+
+def iter_rows(model, skip: int, limit: int, *options, batch_size: int = STREAM_BATCH_SIZE):
+    # The response outlives the request's get_db session, so the stream
+    # opens its own and fetches rows batch_size at a time. Relationships
+    # must be loaded eagerly through options: the session may already be
+    # closed when the last batch is encoded.
+    db = SessionLocal()
+    try:
+        query = db.query(model).options(*options).order_by(model.id).offset(skip).limit(limit)
+        yield from query.yield_per(batch_size)
+    finally:
+        db.close()
+
+# Sparse fieldsets: ?fields=id,email trims the response model, and
+# loader_options() below trims the query to match
+def response_fields(response_model) -> dict:
+    return getattr(response_model, "model_fields", None) or response_model.__fields__
+
+@lru_cache(maxsize=None)
+def sparse_model(model, fields: frozenset):
+    if hasattr(model, "model_fields"):
+        definitions = {name: (field.annotation, field) for name, field in model.model_fields.items()}
+        config = model.model_config
+    else:
+        definitions = {name: (field.outer_type_, field.field_info) for name, field in model.__fields__.items()}
+        config = model.__config__
+    selected = {name: definition for name, definition in definitions.items() if name in fields}
+    return create_model(f"{model.__name__}Fields", __config__=config, **selected)
+
+def field_selector(model):
+    names = set(response_fields(model))
+
+    def select_fields(
+        fields: Optional[str] = Query(
+            None, description=f"Comma-separated subset of: {', '.join(sorted(names))}"
+        )
+    ) -> Optional[frozenset]:
+        if fields is None:
+            return None
+        selected = frozenset(name.strip() for name in fields.split(",") if name.strip())
+        unknown = selected - names
+        if not selected or unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}" if unknown else "No fields selected"
+            )
+        return selected
+    return select_fields
+
+def nested_model(field):
+    # The pydantic model inside a List[...] or Optional[...] field, if any
+    candidates = [getattr(field, "type_", None) or field.annotation]
+    while candidates:
+        candidate = candidates.pop()
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+        candidates.extend(get_args(candidate))
+    return None
+
+# Loading strategies driven by the response model: columns it serializes are
+# loaded with load_only, relationships it serializes with one selectin query
+# each (applied recursively to the nested model), and relationships it never
+# reads are not loaded at all. A page of users with their items therefore
+# costs two queries whatever its size, instead of one per user.
+@lru_cache(maxsize=None)
+def loader_options(model, response_model, fields: Optional[frozenset] = None) -> tuple:
+    mapper = inspect(model)
+    declared = response_fields(response_model)
+    wanted = set(declared) if fields is None else set(declared) & fields
+    keys = {key for key in mapper.column_attrs.keys() if key in wanted}
+    keys.update(mapper.get_property_by_column(column).key for column in mapper.primary_key)
+    options = []
+    for relation in mapper.relationships:
+        attribute = getattr(model, relation.key)
+        if relation.key not in wanted:
+            options.append(noload(attribute))
+            continue
+        # Keep the columns the relationship joins on
+        keys.update(mapper.get_property_by_column(column).key for column in relation.local_columns)
+        nested = nested_model(declared[relation.key])
+        nested_options = loader_options(relation.mapper.class_, nested) if nested else ()
+        options.append(selectinload(attribute).options(*nested_options))
+    options.insert(0, load_only(*(getattr(model, key) for key in sorted(keys))))
+    return tuple(options)
+
+# Query counting: every statement an engine sends to the database inside
+# the block, e.g. to pin the number of queries an endpoint issues
+@contextmanager
+def count_queries(engine):
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+@contextmanager
+def assert_num_queries(engine, expected: int):
+    with count_queries(engine) as statements:
+        yield statements
+    if len(statements) != expected:
+        raise AssertionError(
+            f"Expected {expected} queries, got {len(statements)}:\n" + "\n".join(statements)
+        )
+
+def sparse_response(model, fields: frozenset, content, many: bool = False, headers: Optional[dict] = None) -> Response:
+    sparse = sparse_model(model, fields)
+    if many:
+        body = "[" + ",".join([to_json(sparse, item) for item in content]) + "]"
+    else:
+        body = to_json(sparse, content)
+    return Response(body, media_type="application/json", headers=headers)
+
+# Keyset pagination: ?cursor= (from the previous page's X-Next-Cursor
+# header) seeks the id index straight to the next page, whereas ?skip= has
+# OFFSET walk and discard every earlier row, so deep pages get slower
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": last_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page")
+) -> Optional[int]:
+    if cursor is None:
+        return None
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["after"]
+    except (ValueError, TypeError, KeyError):
+        after = None
+    if not isinstance(after, int) or isinstance(after, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+def page_query(query, model, after: Optional[int], skip: int, limit: int):
+    # Works on both Query (sync) and Select (async)
+    query = query.order_by(model.id)
+    if after is not None:
+        return query.filter(model.id > after).limit(limit)
+    return query.offset(skip).limit(limit)
+
+# Total counts for the X-Total-Count header. COUNT(*) scans the whole table,
+# so counts are cached per database and table, bumped by this process's
+# inserts and recounted every ROW_COUNT_TTL seconds to pick up other writers.
+# The header is therefore approximate.
+ROW_COUNT_TTL = float(os.getenv("ROW_COUNT_TTL", 60))
+
+class RowCounts:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.counts = {}  # (database, table) -> (count, counted_at)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(db, model):
+        return db.get_bind().url.database, model.__tablename__
+
+    def get(self, db, model) -> Optional[int]:
+        count, counted_at = self.counts.get(self.key(db, model), (None, 0.0))
+        return count if time.monotonic() - counted_at < self.ttl else None
+
+    def set(self, db, model, count: int):
+        self.counts[self.key(db, model)] = (count, time.monotonic())
+
+    def add(self, db, model, rows: int):
+        # Uncached counts are left to the next recount
+        key = self.key(db, model)
+        with self.lock:
+            if key in self.counts:
+                count, counted_at = self.counts[key]
+                self.counts[key] = (count + rows, counted_at)
+
+row_counts = RowCounts(ROW_COUNT_TTL)
+
+def total_count(db, model) -> int:
+    count = row_counts.get(db, model)
+    if count is None:
+        count = db.scalar(select(func.count()).select_from(model))
+        row_counts.set(db, model, count)
+    return count
+
+async def total_count_async(db: AsyncSession, model) -> int:
+    count = row_counts.get(db, model)
+    if count is None:
+        count = await db.scalar(select(func.count()).select_from(model))
+        row_counts.set(db, model, count)
+    return count
+
+def page_headers(page: list, limit: int, total: int) -> dict:
+    headers = {"X-Total-Count": str(total)}
+    if page and len(page) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(page[-1].id)
+    return headers
+
+# Bulk inserts: a JSON array or an NDJSON stream of rows, validated one by
+# one and inserted BULK_BATCH_SIZE at a time (a single multi-row INSERT ...
+# RETURNING per batch) inside one transaction. Invalid or conflicting rows
+# are reported by index and do not stop the others.
+NDJSON = "application/x-ndjson"
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+
+async def iter_request_rows(request: Request):
+    if request.headers.get("content-type", "").startswith(NDJSON):
+        # Lines are yielded as bytes and parsed during validation, so a
+        # malformed line only fails its own row
+        buffer = b""
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        rows = None
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    for row in rows:
+        yield row
+
+def validate_row(model, row):
+    if isinstance(row, bytes):
+        return model.model_validate_json(row) if hasattr(model, "model_validate_json") else model.parse_raw(row)
+    return model.model_validate(row) if hasattr(model, "model_validate") else model.parse_obj(row)
+
+async def execute_all(db, statement, params):
+    # Session blocks, so it runs on the threadpool; AsyncSession is awaited
+    if isinstance(db, AsyncSession):
+        return (await db.execute(statement, params)).all()
+    return await run_in_threadpool(lambda: db.execute(statement, params).all())
+
+async def commit(db):
+    if isinstance(db, AsyncSession):
+        await db.commit()
+    else:
+        await run_in_threadpool(db.commit)
+
+async def bulk_insert(db, request: Request, model, table_model, insert_rows) -> dict:
+    # insert_rows(db, {index: row}) returns {index: id or error message}
+    ids, errors = [], []
+    async for batch in iter_batches(iter_request_rows(request), BULK_BATCH_SIZE):
+        valid = {}
+        for row in batch:
+            index = len(ids)
+            ids.append(None)
+            try:
+                valid[index] = validate_row(model, row)
+            except ValidationError as exc:
+                details = [{"loc": list(error["loc"]), "msg": error["msg"]} for error in exc.errors()]
+                errors.append({"index": index, "errors": details})
+        if valid:
+            for index, outcome in (await insert_rows(db, valid)).items():
+                if isinstance(outcome, int):
+                    ids[index] = outcome
+                else:
+                    errors.append({"index": index, "errors": [{"loc": [], "msg": outcome}]})
+    await commit(db)
+    row_counts.add(db, table_model, len(ids) - len(errors))
+    errors.sort(key=lambda error: error["index"])
+    return {"created": len(ids) - len(errors), "ids": ids, "errors": errors}
+
+# Emails already in the table (or inserted by an earlier batch) are skipped
+# by ON CONFLICT and reported, rather than aborting the transaction
+INSERT_USERS = sqlite_insert(User.__table__).on_conflict_do_nothing().returning(User.id, User.email)
+
+async def insert_users(db, users: dict) -> dict:
+    outcomes, by_email = {}, {}
+    for index, user in users.items():
+        if user.email in by_email:
+            outcomes[index] = "Email already registered"
+        else:
+            by_email[user.email] = index
+    rows = [
+        {"email": users[index].email, "hashed_password": users[index].password}  # In production, hash the password
+        for index in by_email.values()
+    ]
+    for user_id, email in await execute_all(db, INSERT_USERS, rows):
+        outcomes[by_email.pop(email)] = user_id
+    for index in by_email.values():
+        outcomes[index] = "Email already registered"
+    return outcomes
+
+INSERT_ITEMS = insert(Item.__table__).returning(Item.id, sort_by_parameter_order=True)
+
+def item_inserter(user_id: int):
+    async def insert_items(db, items: dict) -> dict:
+        rows = [{**item.dict(), "owner_id": user_id} for item in items.values()]
+        item_ids = [item_id for item_id, in await execute_all(db, INSERT_ITEMS, rows)]
+        return dict(zip(items, item_ids))
+    return insert_items
+
 app = FastAPI()
+# DATABASE_MODE picks which router serves the CRUD routes; both expose the
+# same paths and response models
+sync_router = APIRouter()
+async_router = APIRouter()
 
-# Routes
-@app.post("/users/", response_model=User)
+# Routes (sync mode: SessionLocal, run on FastAPI's threadpool)
+@sync_router.post("/users/", response_model=UserResponse)
 def create_user(user: UserCreate, db: SessionLocal = Depends(get_db)):
     db_user = User(email=user.email, hashed_password=user.password)  # In production, hash the password
     db.add(db_user)
     db.commit()
+    row_counts.add(db, User, 1)
     db.refresh(db_user)
     return db_user
 
-@app.get("/users/", response_model=List[User])
-def read_users(skip: int = 0, limit: int = 100, db: SessionLocal = Depends(get_db)):
-    users = db.query(User).offset(skip).limit(limit).all()
+@sync_router.get("/users/", response_model=List[UserResponse])
+def read_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[int] = Depends(decode_cursor),
+    fields: Optional[frozenset] = Depends(field_selector(UserResponse)),
+    db: SessionLocal = Depends(get_db),
+):
+    query = db.query(User).options(*loader_options(User, UserResponse, fields))
+    users = page_query(query, User, after, skip, limit).all()
+    headers = page_headers(users, limit, total_count(db, User))
+    if fields is not None:
+        return sparse_response(UserResponse, fields, users, many=True, headers=headers)
+    response.headers.update(headers)
     return users
 
-@app.get("/users/{user_id}", response_model=User)
-def read_user(user_id: int, db: SessionLocal = Depends(get_db)):
-    db_user = db.query(User).filter(User.id == user_id).first()
+@app.get("/users/stream/", response_model=List[UserResponse])
+def read_users_stream(
+    skip: int = 0,
+    limit: int = Query(100, ge=0),
+    fields: Optional[frozenset] = Depends(field_selector(UserResponse)),
+):
+    model = UserResponse if fields is None else sparse_model(UserResponse, fields)
+    return StreamingListResponse(iter_rows(User, skip, limit, *loader_options(User, UserResponse, fields)), model)
+
+@sync_router.get("/users/{user_id}", response_model=UserResponse)
+def read_user(
+    user_id: int,
+    fields: Optional[frozenset] = Depends(field_selector(UserResponse)),
+    db: SessionLocal = Depends(get_db),
+):
+    query = db.query(User).options(*loader_options(User, UserResponse, fields))
+    db_user = query.filter(User.id == user_id).first()
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    if fields is not None:
+        return sparse_response(UserResponse, fields, db_user)
     return db_user
 
-@app.post("/users/{user_id}/items/", response_model=Item)
+@sync_router.post("/users/{user_id}/items/", response_model=ItemResponse)
 def create_item_for_user(
     user_id: int, item: ItemCreate, db: SessionLocal = Depends(get_db)
 ):
     db_item = Item(**item.dict(), owner_id=user_id)
     db.add(db_item)
     db.commit()
+    row_counts.add(db, Item, 1)
     db.refresh(db_item)
     return db_item
 
-@app.get("/items/", response_model=List[Item])
-def read_items(skip: int = 0, limit: int = 100, db: SessionLocal = Depends(get_db)):
-    items = db.query(Item).offset(skip).limit(limit).all()
-    return items 
\ No newline at end of file
+@sync_router.post("/users/bulk", response_model=BulkResult)
+async def create_users_bulk(request: Request, db: SessionLocal = Depends(get_db)):
+    return await bulk_insert(db, request, UserCreate, User, insert_users)
+
+@sync_router.post("/users/{user_id}/items/bulk", response_model=BulkResult)
+async def create_items_for_user_bulk(user_id: int, request: Request, db: SessionLocal = Depends(get_db)):
+    return await bulk_insert(db, request, ItemCreate, Item, item_inserter(user_id))
+
+@sync_router.get("/items/", response_model=List[ItemResponse])
+def read_items(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[int] = Depends(decode_cursor),
+    fields: Optional[frozenset] = Depends(field_selector(ItemResponse)),
+    db: SessionLocal = Depends(get_db),
+):
+    query = db.query(Item).options(*loader_options(Item, ItemResponse, fields))
+    items = page_query(query, Item, after, skip, limit).all()
+    headers = page_headers(items, limit, total_count(db, Item))
+    if fields is not None:
+        return sparse_response(ItemResponse, fields, items, many=True, headers=headers)
+    response.headers.update(headers)
+    return items
+
+# Routes (async mode: AsyncSessionLocal on the event loop). Lazy loading
+# cannot run here, so relationships in the response are loaded up front.
+@async_router.post("/users/", response_model=UserResponse)
+async def create_user_async(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = User(email=user.email, hashed_password=user.password, items=[])  # In production, hash the password
+    db.add(db_user)
+    await db.commit()
+    row_counts.add(db, User, 1)
+    return db_user
+
+@async_router.get("/users/", response_model=List[UserResponse])
+async def read_users_async(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[int] = Depends(decode_cursor),
+    fields: Optional[frozenset] = Depends(field_selector(UserResponse)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    query = select(User).options(*loader_options(User, UserResponse, fields))
+    users = (await db.execute(page_query(query, User, after, skip, limit))).scalars().all()
+    headers = page_headers(users, limit, await total_count_async(db, User))
+    if fields is not None:
+        return sparse_response(UserResponse, fields, users, many=True, headers=headers)
+    response.headers.update(headers)
+    return users
+
+@async_router.get("/users/{user_id}", response_model=UserResponse)
+async def read_user_async(
+    user_id: int,
+    fields: Optional[frozenset] = Depends(field_selector(UserResponse)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    options = loader_options(User, UserResponse, fields)
+    result = await db.execute(select(User).options(*options).where(User.id == user_id))
+    db_user = result.scalars().first()
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if fields is not None:
+        return sparse_response(UserResponse, fields, db_user)
+    return db_user
+
+@async_router.post("/users/{user_id}/items/", response_model=ItemResponse)
+async def create_item_for_user_async(
+    user_id: int, item: ItemCreate, db: AsyncSession = Depends(get_async_db)
+):
+    db_item = Item(**item.dict(), owner_id=user_id)
+    db.add(db_item)
+    await db.commit()
+    row_counts.add(db, Item, 1)
+    return db_item
+
+@async_router.post("/users/bulk", response_model=BulkResult)
+async def create_users_bulk_async(request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await bulk_insert(db, request, UserCreate, User, insert_users)
+
+@async_router.post("/users/{user_id}/items/bulk", response_model=BulkResult)
+async def create_items_for_user_bulk_async(
+    user_id: int, request: Request, db: AsyncSession = Depends(get_async_db)
+):
+    return await bulk_insert(db, request, ItemCreate, Item, item_inserter(user_id))
+
+@async_router.get("/items/", response_model=List[ItemResponse])
+async def read_items_async(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[int] = Depends(decode_cursor),
+    fields: Optional[frozenset] = Depends(field_selector(ItemResponse)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    query = select(Item).options(*loader_options(Item, ItemResponse, fields))
+    items = (await db.execute(page_query(query, Item, after, skip, limit))).scalars().all()
+    headers = page_headers(items, limit, await total_count_async(db, Item))
+    if fields is not None:
+        return sparse_response(ItemResponse, fields, items, many=True, headers=headers)
+    response.headers.update(headers)
+    return items
+
+# Streaming routes read through SessionLocal in both modes
+@app.get("/items/stream/", response_model=List[ItemResponse])
+def read_items_stream(
+    skip: int = 0,
+    limit: int = Query(100, ge=0),
+    fields: Optional[frozenset] = Depends(field_selector(ItemResponse)),
+):
+    model = ItemResponse if fields is None else sparse_model(ItemResponse, fields)
+    return StreamingListResponse(iter_rows(Item, skip, limit, *loader_options(Item, ItemResponse, fields)), model)
+
+# Registered after the stream routes so /users/stream/ is matched first
+app.include_router(async_router if DATABASE_MODE == "async" else sync_router)
+
+# Streaming benchmark: /items/ vs. /items/stream/ for 100k rows of a scratch
+# database, called as a raw ASGI app because test clients buffer the body.
+# ru_maxrss only ever grows, so the streamed variant runs first.
+async def benchmark_streaming(count=100_000):
+    import resource  # Unix only
+
+    async def measure(path: str, query: bytes):
+        started = time.perf_counter()
+        first_byte = None
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            nonlocal first_byte
+            if message["type"] == "http.response.body" and message.get("body") and first_byte is None:
+                first_byte = time.perf_counter() - started
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query,
+            "headers": [], "server": ("testserver", 80), "client": ("testclient", 50000), "root_path": "",
+        }
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        await app(scope, receive, send)
+        rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+        return first_byte, time.perf_counter() - started, rss_growth * 1024
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_engine = create_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(bind=bench_engine)
+        with bench_engine.begin() as connection:
+            connection.execute(User.__table__.insert(), [{"email": "owner@example.com", "hashed_password": "x"}])
+            connection.execute(
+                Item.__table__.insert(),
+                [{"title": f"Item {i}", "description": "Description", "owner_id": 1} for i in range(count)],
+            )
+        SessionLocal.configure(bind=bench_engine)
+        try:
+            query = f"limit={count}".encode()
+            print(f"{'endpoint':<16} {'TTFB':>9} {'total':>9} {'RSS growth':>11}")
+            for path in ("/items/stream/", "/items/"):
+                first_byte, total, rss = await measure(path, query)
+                print(f"{path:<16} {first_byte * 1000:7.1f}ms {total * 1000:7.0f}ms {rss / 2**20:9.1f}MB")
+        finally:
+            SessionLocal.configure(bind=engine)
+            bench_engine.dispose()
+
+# Query-count check: GET /users/ issues one query for the users and one
+# selectin query per SELECTIN_CHUNK of them for their items, whatever the
+# page size; with lazy loading it was one query per user.
+SELECTIN_CHUNK = 500  # Parent keys per IN (...) in SQLAlchemy's selectinload
+
+def check_constant_queries(page_sizes=(1, 10, 100, 500, 1000), items_per_user=3):
+    from fastapi.testclient import TestClient
+
+    users = max(page_sizes)
+    with tempfile.TemporaryDirectory() as directory:
+        bench_engine = create_sqlite_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(bind=bench_engine)
+        with bench_engine.begin() as connection:
+            connection.execute(
+                User.__table__.insert(),
+                [{"email": f"user{i}@example.com", "hashed_password": "x", "is_active": True} for i in range(users)],
+            )
+            connection.execute(
+                Item.__table__.insert(),
+                [{"title": f"Item {i}", "owner_id": i % users + 1} for i in range(users * items_per_user)],
+            )
+        SessionLocal.configure(bind=bench_engine)
+        try:
+            check_app = FastAPI()
+            check_app.include_router(sync_router)
+            client = TestClient(check_app)
+            client.get("/users/", params={"limit": 1})  # Connect and initialize the dialect
+            print(f"{'page size':>9} {'full':>6} {'sparse':>7}")
+            for limit in page_sizes:
+                expected = 1 + -(-limit // SELECTIN_CHUNK)
+                with assert_num_queries(bench_engine, expected):
+                    response = client.get("/users/", params={"limit": limit})
+                assert len(response.json()) == limit
+                assert all(len(user["items"]) == items_per_user for user in response.json())
+                with assert_num_queries(bench_engine, 1):
+                    client.get("/users/", params={"limit": limit, "fields": "id,email"})
+                print(f"{limit:9d} {expected:6d} {1:7d}")
+        finally:
+            SessionLocal.configure(bind=engine)
+            bench_engine.dispose()
+
+# Concurrency benchmark: the same read-heavy load against the sync and the
+# async routers, sharing one scratch database
+async def benchmark_database_modes(users=200, requests=2000, concurrency=100):
+    import httpx
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_engine = create_sqlite_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(bind=bench_engine)
+        with bench_engine.begin() as connection:
+            connection.execute(
+                User.__table__.insert(),
+                [{"email": f"user{i}@example.com", "hashed_password": "x", "is_active": True} for i in range(users)],
+            )
+            connection.execute(
+                Item.__table__.insert(),
+                [{"title": f"Item {i}", "description": "Description", "owner_id": i % users + 1} for i in range(users * 5)],
+            )
+        bench_async_engine = create_sqlite_engine(f"sqlite+aiosqlite:///{directory}/bench.db")
+        SessionLocal.configure(bind=bench_engine)
+        AsyncSessionLocal.configure(bind=bench_async_engine)
+        try:
+            for mode, router in (("sync", sync_router), ("async", async_router)):
+                bench_app = FastAPI()
+                bench_app.include_router(router)
+                transport = httpx.ASGITransport(app=bench_app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    async def worker(worker_id: int):
+                        for i in range(requests // concurrency):
+                            user_id = (worker_id * 7 + i) % users + 1
+                            if i % 2:
+                                response = await client.get(f"/users/{user_id}")
+                            else:
+                                response = await client.get("/users/", params={"skip": user_id, "limit": 10})
+                            assert response.status_code == 200
+
+                    started = time.perf_counter()
+                    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+                    elapsed = time.perf_counter() - started
+                print(f"{mode:<6} {requests / elapsed:8.0f} req/s  ({requests} requests, concurrency {concurrency})")
+        finally:
+            SessionLocal.configure(bind=engine)
+            AsyncSessionLocal.configure(bind=async_engine)
+            bench_engine.dispose()
+            await bench_async_engine.dispose()
+
+# Write-concurrency benchmark: concurrent clients creating users and items
+# while others read, against SQLite's defaults (rollback journal, full
+# fsync, 5s lock timeout) and against the tuned profile. Both runs share the
+# pool configuration, so only the pragmas differ.
+async def benchmark_sqlite_tuning(requests=3000, concurrency=50):
+    import httpx
+
+    print(f"{'profile':<8} {'journal':>8} {'writes/s':>9} {'reads/s':>9} {'errors':>7}")
+    for profile, tuned in (("default", False), ("tuned", True)):
+        with tempfile.TemporaryDirectory() as directory:
+            bench_engine = create_sqlite_engine(
+                f"sqlite:///{directory}/bench.db", tuned=tuned, pool_size=SQLITE_POOL_SIZE, max_overflow=-1
+            )
+            Base.metadata.create_all(bind=bench_engine)
+            with bench_engine.connect() as connection:
+                journal = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+            SessionLocal.configure(bind=bench_engine)
+            try:
+                bench_app = FastAPI()
+                bench_app.include_router(sync_router)
+                # Report failed requests as 500s instead of raising them
+                transport = httpx.ASGITransport(app=bench_app, raise_app_exceptions=False)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    counts = {"writes": 0, "reads": 0, "errors": 0}
+
+                    async def worker(worker_id: int):
+                        user_id = None
+                        for i in range(requests // concurrency):
+                            if user_id is None or i % 3 == 0:
+                                response = await client.post(
+                                    "/users/", json={"email": f"user{worker_id}-{i}@example.com", "password": "x"}
+                                )
+                                kind = "writes"
+                                if response.status_code == 200:
+                                    user_id = response.json()["id"]
+                            elif i % 3 == 1:
+                                response = await client.post(
+                                    f"/users/{user_id}/items/", json={"title": f"Item {i}"}
+                                )
+                                kind = "writes"
+                            else:
+                                response = await client.get(f"/users/{user_id}")
+                                kind = "reads"
+                            counts[kind if response.status_code == 200 else "errors"] += 1
+
+                    started = time.perf_counter()
+                    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+                    elapsed = time.perf_counter() - started
+                print(
+                    f"{profile:<8} {journal:>8} {counts['writes'] / elapsed:9.0f} "
+                    f"{counts['reads'] / elapsed:9.0f} {counts['errors']:7d}"
+                )
+            finally:
+                SessionLocal.configure(bind=engine)
+                bench_engine.dispose()
+
+# Bulk insert benchmark: rows/s through the single-row endpoints (a sample
+# of single_rows requests, one at a time like a loader script) against
+# POST /users/bulk and /users/{id}/items/bulk for rows rows, as a JSON array
+# and as NDJSON
+async def benchmark_bulk_insert(rows=100_000, single_rows=2000):
+    import httpx
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_engine = create_sqlite_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(bind=bench_engine)
+        SessionLocal.configure(bind=bench_engine)
+        try:
+            bench_app = FastAPI()
+            bench_app.include_router(sync_router)
+            transport = httpx.ASGITransport(app=bench_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+                owner_id = (await client.post("/users/", json={"email": "owner@example.com", "password": "x"})).json()["id"]
+
+                async def single(kind, count):
+                    started = time.perf_counter()
+                    for i in range(count):
+                        if kind == "users":
+                            response = await client.post("/users/", json={"email": f"single{i}@example.com", "password": "x"})
+                        else:
+                            response = await client.post(f"/users/{owner_id}/items/", json={"title": f"Item {i}"})
+                        assert response.status_code == 200
+                    return count / (time.perf_counter() - started)
+
+                async def bulk(kind, count, encoding):
+                    if kind == "users":
+                        path = "/users/bulk"
+                        body = [{"email": f"{encoding}{i}@example.com", "password": "x"} for i in range(count)]
+                    else:
+                        path = f"/users/{owner_id}/items/bulk"
+                        body = [{"title": f"Item {i}", "description": "Description"} for i in range(count)]
+                    if encoding == "ndjson":
+                        content = "\n".join(json.dumps(row) for row in body).encode()
+                        headers = {"content-type": NDJSON}
+                    else:
+                        content = json.dumps(body).encode()
+                        headers = {"content-type": "application/json"}
+                    started = time.perf_counter()
+                    response = await client.post(path, content=content, headers=headers)
+                    elapsed = time.perf_counter() - started
+                    assert response.status_code == 200 and response.json()["created"] == count
+                    return count / elapsed
+
+                print(f"{'rows':<6} {'single':>10} {'bulk json':>10} {'bulk ndjson':>12} {'speedup':>8}")
+                for kind in ("users", "items"):
+                    single_rate = await single(kind, single_rows)
+                    json_rate = await bulk(kind, rows, "json")
+                    ndjson_rate = await bulk(kind, rows, "ndjson")
+                    print(
+                        f"{kind:<6} {single_rate:8.0f}/s {json_rate:8.0f}/s {ndjson_rate:10.0f}/s "
+                        f"{min(json_rate, ndjson_rate) / single_rate:7.0f}x"
+                    )
+        finally:
+            SessionLocal.configure(bind=engine)
+            bench_engine.dispose()
+
+# Pagination benchmark: GET /items/ latency at increasing depth in a rows-row
+# table, paging with ?skip= (OFFSET) and with ?cursor= (keyset). Ids are
+# contiguous, so the cursor for page n is the one page n - 1 would return.
+async def benchmark_pagination(rows=5_000_000, limit=100, pages=(1, 1000, 10_000, 50_000), runs=5):
+    import httpx
+    import statistics
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench_engine = create_sqlite_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(bind=bench_engine)
+        with bench_engine.begin() as connection:
+            connection.execute(User.__table__.insert(), [{"email": "owner@example.com", "hashed_password": "x"}])
+            connection.exec_driver_sql(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+                "INSERT INTO items (title, description, owner_id) SELECT 'Item ' || i, 'Description', 1 FROM n",
+                (rows,),
+            )
+        SessionLocal.configure(bind=bench_engine)
+        try:
+            bench_app = FastAPI()
+            bench_app.include_router(sync_router)
+            transport = httpx.ASGITransport(app=bench_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                async def latency(params):
+                    timings = []
+                    for _ in range(runs):
+                        started = time.perf_counter()
+                        response = await client.get("/items/", params=params)
+                        timings.append(time.perf_counter() - started)
+                        assert response.status_code == 200 and len(response.json()) == limit
+                    return statistics.median(timings) * 1000
+
+                started = time.perf_counter()
+                await client.get("/items/", params={"limit": 1})  # Fills the X-Total-Count cache
+                print(f"first count of {rows} rows: {(time.perf_counter() - started) * 1000:.0f}ms")
+                print(f"{'page':>7} {'skip':>10} {'cursor':>10}")
+                for page in pages:
+                    offset = (page - 1) * limit
+                    skip_ms = await latency({"skip": offset, "limit": limit})
+                    params = {"limit": limit}
+                    if offset:
+                        params["cursor"] = encode_cursor(offset)
+                    cursor_ms = await latency(params)
+                    print(f"{page:7d} {skip_ms:8.1f}ms {cursor_ms:8.1f}ms")
+        finally:
+            SessionLocal.configure(bind=engine)
+            bench_engine.dispose()
+
+if __name__ == "__main__":
+    check_constant_queries()
+    asyncio.run(benchmark_streaming())
+    asyncio.run(benchmark_database_modes())
+    asyncio.run(benchmark_sqlite_tuning())
+    asyncio.run(benchmark_bulk_insert())
+    asyncio.run(benchmark_pagination())
@@ -1,10 +1,16 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
 import uvicorn
+import json
 import os
 from dotenv import load_dotenv
 
+try:
+    import msgpack
+except ImportError:  # MessagePack is only offered when msgpack is installed
+    msgpack = None
+
 # Load environment variables
 load_dotenv()
 
@@ -21,6 +27,53 @@ class Item(BaseModel):
     description: Optional[str] = None
     price: float
 
+# Response formats negotiated through the Accept header
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/msgpack"
+MEDIA_TYPES = [JSON, NDJSON] + ([MSGPACK] if msgpack is not None else [])
+NEGOTIATED_CONTENT = {"content": {media_type: {} for media_type in MEDIA_TYPES[1:]}}
+
+def negotiated_media_type(request: Request) -> str:
+    # Highest-q supported type in Accept, defaulting to JSON
+    best, best_rank = JSON, (0.0, 0)
+    for entry in request.headers.get("accept", "").split(","):
+        media_type, *params = [part.strip() for part in entry.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type == "application/x-msgpack":
+            media_type = MSGPACK
+        if media_type in MEDIA_TYPES:
+            rank = (quality, 1)
+        elif media_type in ("*/*", "application/*"):
+            media_type, rank = JSON, (quality, 0)
+        else:
+            continue
+        if quality > 0 and rank > best_rank:
+            best, best_rank = media_type, rank
+    return best
+
+def dump(model, item) -> dict:
+    # Pydantic v2 or v1: validate item and return JSON-compatible data
+    if hasattr(model, "model_validate"):
+        return model.model_validate(item).model_dump(mode="json")
+    return json.loads(model.parse_obj(item).json())
+
+def model_response(model, content, media_type: str, many: bool = False) -> Response:
+    # NDJSON or MessagePack body for the non-JSON media types
+    data = [dump(model, item) for item in (content if many else [content])]
+    if media_type == MSGPACK:
+        body = msgpack.packb(data if many else data[0])
+    else:
+        body = "".join([json.dumps(row, separators=(",", ":")) + "\n" for row in data])
+    return Response(body, media_type=media_type)
+
 # Database simulation
 fake_items_db = {
     1: {"id": 1, "name": "Item 1", "description": "Description 1", "price": 10.5},
@@ -35,15 +88,21 @@ async def root():
         "environment": os.getenv("ENVIRONMENT", "development")
     }
 
-@app.get("/items/", response_model=List[Item])
-async def read_items(skip: int = 0, limit: int = 100):
-    items = list(fake_items_db.values())
-    return items[skip : skip + limit]
-
-@app.get("/items/{item_id}", response_model=Item)
-async def read_item(item_id: int):
+@app.get("/items/", response_model=List[Item], responses={200: NEGOTIATED_CONTENT})
+async def read_items(
+    skip: int = 0, limit: int = 100, media_type: str = Depends(negotiated_media_type)
+):
+    items = list(fake_items_db.values())[skip : skip + limit]
+    if media_type != JSON:
+        return model_response(Item, items, media_type, many=True)
+    return items
+
+@app.get("/items/{item_id}", response_model=Item, responses={200: NEGOTIATED_CONTENT})
+async def read_item(item_id: int, media_type: str = Depends(negotiated_media_type)):
     if item_id not in fake_items_db:
         raise HTTPException(status_code=404, detail="Item not found")
+    if media_type != JSON:
+        return model_response(Item, fake_items_db[item_id], media_type)
     return fake_items_db[item_id]
 
 @app.get("/health")
@@ -5,11 +5,11 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from typing import List, Optional, Dict
 import logging
 import time
 import json
+from functools import lru_cache
 from datetime import datetime, timedelta
 import redis
 import httpx
@@ -51,8 +51,14 @@ class User(BaseModel):
 class UserInDB(User):
     hashed_password: str
 
-# Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Security: the CryptContext (and passlib itself) is set up on first use to
+# keep worker cold start down
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Rate limiting configuration
@@ -156,10 +162,10 @@ app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Security functions
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Cold-start benchmark for the lesson apps: every lesson module is imported in a
+# fresh interpreter under `python -X importtime`, and its own line in the
+# report gives the cumulative import cost (its imports plus module body).
+#
+#   python benchmark_importtime.py                      # all lessons
+#   python benchmark_importtime.py 13security 14database
+#   python benchmark_importtime.py --output before.json
+#   python benchmark_importtime.py --compare before.json
+
+LESSONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def lesson_names(selected=None):
+    for name in sorted(os.listdir(LESSONS_DIR)):
+        if os.path.isfile(os.path.join(LESSONS_DIR, name, f"{name}.py")):
+            if not selected or name in selected:
+                yield name
+
+def parse_importtime(report: str):
+    # Lines look like "import time:  self_us | cumulative_us | <indent>module"
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        depth = (len(module) - len(module.lstrip())) // 2
+        yield module.strip(), depth, int(self_us), int(cumulative_us)
+
+def measure(name: str, runs: int) -> dict:
+    # __import__ goes through the C import path that -X importtime instruments
+    code = f"import sys; sys.path.insert(0, {os.path.join(LESSONS_DIR, name)!r}); __import__({name!r})"
+    totals, bodies, imports = [], [], {}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cwd:  # Lessons may create databases or upload dirs
+            result = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", code],
+                cwd=cwd, capture_output=True, text=True, timeout=300,
+            )
+        if result.returncode != 0:
+            errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+            return {"error": errors[-1] if errors else f"exit code {result.returncode}"}
+        for module, depth, self_us, cumulative_us in parse_importtime(result.stderr):
+            if module == name and depth == 0:
+                totals.append(cumulative_us / 1000)
+                bodies.append(self_us / 1000)
+            elif depth == 1:  # Imported for the first time by the lesson itself
+                imports.setdefault(module, []).append(cumulative_us / 1000)
+    heaviest = sorted(imports.items(), key=lambda entry: -statistics.median(entry[1]))[:3]
+    return {
+        "total_ms": round(statistics.median(totals), 1),
+        "body_ms": round(statistics.median(bodies), 1),
+        "heaviest_imports": {module: round(statistics.median(times), 1) for module, times in heaviest},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of each lesson app")
+    parser.add_argument("lessons", nargs="*", help="lesson directories to measure (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per lesson (median is reported)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON file from an earlier --output run to diff against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print(f"{'lesson':<24} {'total':>10} {'body':>10} {'delta':>10}  heaviest imports")
+    for name in lesson_names(args.lessons):
+        result = results[name] = measure(name, args.runs)
+        if "error" in result:
+            print(f"{name:<24} {'skipped':>10}  {result['error']}")
+            continue
+        previous = baseline.get(name, {}).get("total_ms")
+        delta = f"{result['total_ms'] - previous:+9.1f}" if previous is not None else ""
+        heaviest = ", ".join(f"{module} {ms:.0f}ms" for module, ms in result["heaviest_imports"].items())
+        print(f"{name:<24} {result['total_ms']:8.1f}ms {result['body_ms']:8.1f}ms {delta:>10}  {heaviest}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()